@@ -2,45 +2,65 @@
 Módulo de configuración para cargar variables de entorno y validar settings.
 """
 import os
-from dataclasses import dataclass
-from typing import Optional
+from functools import lru_cache
+from typing import Mapping, NamedTuple, Optional, Tuple
 from dotenv import load_dotenv
 
-# Cargar variables de entorno desde archivo .env
-load_dotenv()
+# Variables de entorno requeridas por load_config
+REQUIRED_ENV_VARS = (
+    "AZURE_SEARCH_ENDPOINT",
+    "AZURE_SEARCH_API_KEY",
+    "AZURE_SEARCH_INDEX",
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_OPENAI_API_KEY",
+    "AZURE_OPENAI_DEPLOYMENT",
+)
 
+# Configuración precompilada desde .env (ver scripts/compile_env.py)
+try:
+    from app import _env_compiled
+except ImportError:
+    _env_compiled = None
 
-@dataclass
-class AzureSearchConfig:
+# Cargar variables de entorno desde archivo .env solo si no están ya exportadas
+# ni precompiladas
+if _env_compiled is None and not all(k in os.environ for k in REQUIRED_ENV_VARS):
+    load_dotenv()
+
+
+class AzureSearchConfig(NamedTuple):
     """Configuración para Azure AI Search."""
     endpoint: str
     api_key: str
-    index_name: str
+    index_names: Tuple[str, ...]  # Uno o más índices (AZURE_SEARCH_INDEX separado por comas)
 
 
-@dataclass
-class AzureOpenAIConfig:
+class AzureOpenAIConfig(NamedTuple):
     """Configuración para Azure OpenAI."""
     endpoint: str
     api_key: str
     deployment_name: str
 
 
-@dataclass
-class AppConfig:
+class AppConfig(NamedTuple):
     """Configuración completa de la aplicación."""
     azure_search: AzureSearchConfig
     azure_openai: AzureOpenAIConfig
     streamlit_port: Optional[int] = None
 
 
-def get_env_var(var_name: str, required: bool = True) -> str:
+def get_env_var(
+    var_name: str,
+    required: bool = True,
+    env: Optional[Mapping[str, str]] = None
+) -> str:
     """
     Obtiene una variable de entorno y valida que exista si es requerida.
     
     Args:
         var_name: Nombre de la variable de entorno.
         required: Si es True, lanza error si la variable no existe.
+        env: Snapshot de variables a consultar. Por defecto usa os.environ.
     
     Returns:
         Valor de la variable de entorno.
@@ -48,7 +68,7 @@ def get_env_var(var_name: str, required: bool = True) -> str:
     Raises:
         ValueError: Si la variable es requerida y no existe.
     """
-    value = os.getenv(var_name)
+    value = (os.environ if env is None else env).get(var_name)
     if required and not value:
         raise ValueError(
             f"Variable de entorno requerida '{var_name}' no encontrada. "
@@ -57,40 +77,53 @@ def get_env_var(var_name: str, required: bool = True) -> str:
     return value
 
 
+@lru_cache(maxsize=1)
 def load_config() -> AppConfig:
     """
     Carga y valida la configuración desde variables de entorno.
     
+    Si existe app/_env_compiled.py se usan sus valores; si no, se leen las
+    variables de entorno. El resultado se cachea: Streamlit re-ejecuta el script
+    en cada interacción y la configuración no cambia durante la vida del proceso.
+    
     Returns:
         AppConfig con toda la configuración validada.
     
     Raises:
         ValueError: Si faltan variables de entorno requeridas.
     """
-    # Azure AI Search
-    search_endpoint = get_env_var("AZURE_SEARCH_ENDPOINT")
-    search_api_key = get_env_var("AZURE_SEARCH_API_KEY")
-    search_index = get_env_var("AZURE_SEARCH_INDEX")
+    # Snapshot único de las variables (módulo compilado o entorno)
+    if _env_compiled is not None:
+        env = {k: v for k, v in vars(_env_compiled).items() if k.isupper()}
+    else:
+        env = os.environ.copy()
+    
+    # Azure AI Search y Azure OpenAI
+    values = {name: get_env_var(name, env=env) for name in REQUIRED_ENV_VARS}
     
-    # Azure OpenAI
-    openai_endpoint = get_env_var("AZURE_OPENAI_ENDPOINT")
-    openai_api_key = get_env_var("AZURE_OPENAI_API_KEY")
-    openai_deployment = get_env_var("AZURE_OPENAI_DEPLOYMENT")
+    # AZURE_SEARCH_INDEX admite varios índices separados por comas
+    index_names = tuple(
+        name.strip() for name in values["AZURE_SEARCH_INDEX"].split(",") if name.strip()
+    )
+    if not index_names:
+        raise ValueError(
+            "La variable de entorno 'AZURE_SEARCH_INDEX' no contiene ningún nombre de índice válido."
+        )
     
     # Streamlit (opcional)
-    streamlit_port_str = get_env_var("STREAMLIT_SERVER_PORT", required=False)
+    streamlit_port_str = get_env_var("STREAMLIT_SERVER_PORT", required=False, env=env)
     streamlit_port = int(streamlit_port_str) if streamlit_port_str else None
     
     return AppConfig(
         azure_search=AzureSearchConfig(
-            endpoint=search_endpoint,
-            api_key=search_api_key,
-            index_name=search_index
+            endpoint=values["AZURE_SEARCH_ENDPOINT"],
+            api_key=values["AZURE_SEARCH_API_KEY"],
+            index_names=index_names
         ),
         azure_openai=AzureOpenAIConfig(
-            endpoint=openai_endpoint,
-            api_key=openai_api_key,
-            deployment_name=openai_deployment
+            endpoint=values["AZURE_OPENAI_ENDPOINT"],
+            api_key=values["AZURE_OPENAI_API_KEY"],
+            deployment_name=values["AZURE_OPENAI_DEPLOYMENT"]
         ),
         streamlit_port=streamlit_port
     )
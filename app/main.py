@@ -1,10 +1,41 @@
 """
 Aplicación principal de Streamlit para el chat RAG con manuales biomédicos.
 """
+from collections import deque
+from typing import Dict, List
+
 import streamlit as st
 from app.config import load_config
+from app.services.answer_cache import AnswerCache
 from app.services.rag_pipeline import RAGPipeline
 
+# Máximo de mensajes (usuario + asistente) que se conservan en el historial
+MAX_HISTORY_MESSAGES = 40
+
+# Contenido estático en markdown
+HEADER_DESCRIPTION = """
+**Aplicación RAG (Retrieval Augmented Generation)** para consultar manuales técnicos y de usuario 
+de dispositivos biomédicos usando Azure AI Search y Azure OpenAI.
+
+Esta herramienta está diseñada para ayudar a **field engineers** a encontrar información técnica 
+durante el mantenimiento de equipos.
+"""
+
+SIDEBAR_INSTRUCTIONS = """
+**Ejemplos de preguntas:**
+- "¿Cómo calibro el sensor de oxígeno del modelo X?"
+- "¿Cuál es el procedimiento de mantenimiento preventivo?"
+- "¿Qué código de error significa E-123?"
+- "¿Cómo cambio el filtro del dispositivo Y?"
+
+**Consejos:**
+- Sé específico con modelos y números de parte
+- Usa términos técnicos cuando los conozcas
+- Si no encuentras respuesta, reformula la pregunta
+"""
+
+FOOTER_CAPTION = "💡 Esta aplicación usa Azure AI Search para búsqueda semántica y Azure OpenAI para generación de respuestas."
+
 # Configurar página
 st.set_page_config(
     page_title="Chat con Manuales Biomédicos",
@@ -30,19 +61,41 @@ def get_rag_pipeline():
 
 rag_pipeline = get_rag_pipeline()
 
-# Inicializar historial de chat en session_state
+
+# Caché de respuestas compartida por todas las sesiones del proceso
+@st.cache_resource
+def get_answer_cache() -> AnswerCache:
+    """Inicializa y cachea la caché de respuestas por (pregunta, top_k, temperatura)."""
+    return AnswerCache(max_entries=128, ttl=600)
+
+answer_cache = get_answer_cache()
+
+
+def _sources_markdown(sources: List[Dict]) -> str:
+    """Construye en un solo bloque markdown la lista de fuentes de una respuesta."""
+    src_md = "\n".join(
+        f"{i}. {s.get('source', 'Unknown')}"
+        + (f" (pág. {page})" if (page := s.get("pageNumber")) is not None else "")
+        + (f" - Relevancia: {score:.2f}" if (score := s.get("score", 0.0)) > 0 else "")
+        for i, s in enumerate(sources, 1)
+    )
+    return "---\n\n**📚 Fuentes utilizadas:**\n" + src_md
+
+
+def _push_message(role: str, content: str, **extra) -> Dict:
+    """Añade un mensaje al historial de chat con un formato único y lo retorna."""
+    message = {"role": role, "content": content, **extra}
+    st.session_state.messages.append(message)
+    return message
+
+
+# Inicializar historial de chat en session_state (ventana deslizante acotada)
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    st.session_state.messages = deque(maxlen=MAX_HISTORY_MESSAGES)
 
 # Título y descripción
 st.title("🏥 Chat con Manuales Biomédicos")
-st.markdown("""
-**Aplicación RAG (Retrieval Augmented Generation)** para consultar manuales técnicos y de usuario 
-de dispositivos biomédicos usando Azure AI Search y Azure OpenAI.
-
-Esta herramienta está diseñada para ayudar a **field engineers** a encontrar información técnica 
-durante el mantenimiento de equipos.
-""")
+st.markdown(HEADER_DESCRIPTION)
 
 # Sidebar con parámetros y configuración
 with st.sidebar:
@@ -73,22 +126,11 @@ with st.sidebar:
     st.divider()
     
     st.subheader("📖 Instrucciones de uso")
-    st.markdown("""
-    **Ejemplos de preguntas:**
-    - "¿Cómo calibro el sensor de oxígeno del modelo X?"
-    - "¿Cuál es el procedimiento de mantenimiento preventivo?"
-    - "¿Qué código de error significa E-123?"
-    - "¿Cómo cambio el filtro del dispositivo Y?"
-    
-    **Consejos:**
-    - Sé específico con modelos y números de parte
-    - Usa términos técnicos cuando los conozcas
-    - Si no encuentras respuesta, reformula la pregunta
-    """)
+    st.markdown(SIDEBAR_INSTRUCTIONS)
     
     # Botón para limpiar conversación
     if st.button("🗑️ Limpiar conversación", use_container_width=True):
-        st.session_state.messages = []
+        st.session_state.messages = deque(maxlen=MAX_HISTORY_MESSAGES)
         st.rerun()
 
 # Cuerpo principal: historial de chat
@@ -103,22 +145,12 @@ for message in st.session_state.messages:
         if message["role"] == "assistant" and "sources" in message:
             sources = message["sources"]
             if sources:
-                st.markdown("---")
-                st.markdown("**📚 Fuentes utilizadas:**")
-                for i, source in enumerate(sources, 1):
-                    source_name = source.get("source", "Unknown")
-                    score = source.get("score", 0.0)
-                    
-                    source_text = f"{i}. {source_name}"
-                    if score > 0:
-                        source_text += f" - Relevancia: {score:.2f}"
-                    
-                    st.caption(source_text)
+                st.markdown(_sources_markdown(sources))
 
 # Campo de entrada para nueva pregunta
 if prompt := st.chat_input("Escribe tu pregunta sobre los manuales biomédicos..."):
     # Añadir mensaje del usuario al historial
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    _push_message("user", prompt)
     
     # Mostrar mensaje del usuario
     with st.chat_message("user"):
@@ -128,52 +160,46 @@ if prompt := st.chat_input("Escribe tu pregunta sobre los manuales biomédicos..
     with st.chat_message("assistant"):
         with st.spinner("Buscando en los manuales y generando respuesta..."):
             try:
-                # Llamar al pipeline RAG
-                result = rag_pipeline.rag_answer(
-                    user_question=prompt,
-                    top_k=top_k,
-                    temperature=temperature
-                )
+                # Reutilizar la respuesta si ya está en caché para estos parámetros
+                cache_key = (prompt, top_k, temperature)
+                result = answer_cache.get(cache_key)
+                
+                if result is not None:
+                    # Mostrar respuesta
+                    st.markdown(result["answer"])
+                else:
+                    result = rag_pipeline.rag_answer_stream(
+                        user_question=prompt,
+                        top_k=top_k,
+                        temperature=temperature
+                    )
+                    
+                    # Mostrar la respuesta a medida que llega del modelo
+                    if isinstance(result["answer"], str):
+                        st.markdown(result["answer"])
+                    else:
+                        result["answer"] = st.write_stream(result["answer"])
+                    
+                    # Los mensajes de error no se cachean (p. ej. rate limit)
+                    if not result.get("error"):
+                        answer_cache.set(cache_key, result)
                 
                 answer = result["answer"]
                 sources = result["sources"]
                 
-                # Mostrar respuesta
-                st.markdown(answer)
-                
                 # Mostrar fuentes
                 if sources:
-                    st.markdown("---")
-                    st.markdown("**📚 Fuentes utilizadas:**")
-                    for i, source in enumerate(sources, 1):
-                        source_name = source.get("source", "Unknown")
-                        page = source.get("pageNumber")
-                        score = source.get("score", 0.0)
-                        
-                        source_text = f"{i}. {source_name}"
-                        if page is not None:
-                            source_text += f" (pág. {page})"
-                        if score > 0:
-                            source_text += f" - Relevancia: {score:.2f}"
-                        
-                        st.caption(source_text)
+                    st.markdown(_sources_markdown(sources))
                 
                 # Guardar respuesta en el historial
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": answer,
-                    "sources": sources
-                })
+                _push_message("assistant", answer, sources=sources)
                 
             except Exception as e:
                 error_msg = f"❌ Error al procesar la pregunta: {str(e)}"
                 st.error(error_msg)
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": error_msg
-                })
+                _push_message("assistant", error_msg)
 
 # Footer
 st.divider()
-st.caption("💡 Esta aplicación usa Azure AI Search para búsqueda semántica y Azure OpenAI para generación de respuestas.")
+st.caption(FOOTER_CAPTION)
 
@@ -0,0 +1,63 @@
+"""
+Caché en memoria de respuestas RAG con expiración (TTL) y límite de entradas (LRU).
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+
+class AnswerCache:
+    """Mapeo TTL/LRU de respuestas ya generadas, seguro entre hilos."""
+    
+    def __init__(self, max_entries: int = 128, ttl: float = 600.0):
+        """
+        Inicializa la caché.
+        
+        Args:
+            max_entries: Número máximo de respuestas almacenadas. Al superarlo se
+                        descarta la usada hace más tiempo.
+            ttl: Segundos que una respuesta permanece válida.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Dict]]" = OrderedDict()
+        # Streamlit atiende cada sesión en su propio hilo
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable) -> Optional[Dict]:
+        """
+        Retorna la respuesta asociada a la clave, o None si no existe o expiró.
+        
+        Args:
+            key: Clave de la respuesta.
+        
+        Returns:
+            Respuesta almacenada o None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: Hashable, value: Dict) -> None:
+        """
+        Almacena una respuesta, descartando la más antigua si se supera el límite.
+        
+        Args:
+            key: Clave de la respuesta.
+            value: Respuesta a almacenar.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
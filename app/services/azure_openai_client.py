@@ -1,11 +1,17 @@
 """
 Cliente para interactuar con Azure OpenAI.
 """
-from typing import List
-from openai import AzureOpenAI
+from typing import Dict, Iterator
+from openai import AzureOpenAI, DefaultHttpxClient
 
 from app.config import AzureOpenAIConfig
 
+# Cliente HTTP compartido por todas las instancias del proceso: mantiene el pool
+# de conexiones keep-alive entre consultas. DefaultHttpxClient conserva los
+# valores por defecto del SDK (timeouts, límites de conexión, redirecciones);
+# los reintentos los gestiona el SDK con max_retries
+_HTTP_CLIENT = DefaultHttpxClient()
+
 
 class AzureOpenAIClient:
     """Cliente para generar respuestas usando Azure OpenAI."""
@@ -21,14 +27,118 @@ class AzureOpenAIClient:
         self.client = AzureOpenAI(
             azure_endpoint=config.endpoint,
             api_key=config.api_key,
-            api_version="2024-02-15-preview"  # Versión que soporta chat completions
+            api_version="2024-02-15-preview",  # Versión que soporta chat completions
+            http_client=_HTTP_CLIENT
         )
     
+    def _build_call_params(
+        self,
+        system_prompt: str,
+        user_message: str,
+        context: str,
+        temperature: float
+    ) -> Dict:
+        """
+        Construye los parámetros de la llamada a chat completions.
+        
+        Args:
+            system_prompt: Instrucciones del sistema para el modelo.
+            user_message: Pregunta o mensaje del usuario.
+            context: Texto del contexto recuperado, ya unido y listo para el prompt.
+            temperature: Temperatura para la generación (0.0-1.0).
+        
+        Returns:
+            Diccionario de parámetros para client.chat.completions.create.
+        """
+        # Construir el prompt del usuario con el contexto
+        user_prompt_with_context = f"""Contexto de los manuales técnicos:
+
+{context}
+
+---
+
+Pregunta del usuario: {user_message}
+
+Por favor, responde usando únicamente la información del contexto proporcionado. Si el contexto no contiene información suficiente para responder, indícalo claramente."""
+        
+        # Preparar mensajes en formato chat
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt_with_context}
+        ]
+        
+        # Preparar parámetros de la llamada
+        # Algunos modelos solo soportan temperature=1 (valor por defecto)
+        call_params = {
+            "model": self.config.deployment_name,
+            "messages": messages,
+            "max_completion_tokens": 500  # Reducido para ahorrar tokens y evitar rate limits
+        }
+        
+        # Solo añadir temperature si es diferente de 1.0
+        # Si el modelo no lo soporta, se intentará sin este parámetro
+        if temperature != 1.0:
+            call_params["temperature"] = temperature
+        
+        return call_params
+    
+    def _create_completion(self, call_params: Dict):
+        """
+        Llama al modelo, reintentando sin temperature si el modelo no la soporta.
+        
+        Args:
+            call_params: Parámetros para client.chat.completions.create.
+        
+        Returns:
+            Respuesta del SDK (completa o stream, según call_params).
+        """
+        try:
+            return self.client.chat.completions.create(**call_params)
+        except Exception as temp_error:
+            # Si falla por temperature no soportado, reintentar sin ese parámetro
+            error_str = str(temp_error)
+            if "temperature" in error_str.lower() and "unsupported" in error_str.lower():
+                # Reintentar sin temperature (usará el valor por defecto del modelo)
+                call_params.pop("temperature", None)
+                return self.client.chat.completions.create(**call_params)
+            # Si es otro error, relanzarlo
+            raise
+    
+    @staticmethod
+    def _translate_error(error: Exception) -> Exception:
+        """
+        Traduce errores de Azure OpenAI a excepciones con mensajes claros.
+        
+        Args:
+            error: Excepción original del SDK.
+        
+        Returns:
+            Excepción con un mensaje descriptivo para el usuario.
+        """
+        # Detectar errores específicos de Azure OpenAI
+        error_str = str(error)
+        
+        # Error 429: Rate Limit (límite de tasa alcanzado)
+        if "429" in error_str or "RateLimitReached" in error_str or "rate limit" in error_str.lower():
+            return Exception(
+                "Límite de tasa alcanzado: Has excedido el límite de tokens por minuto de tu plan de Azure OpenAI. "
+                "Por favor, espera 60 segundos antes de intentar de nuevo. "
+                "Para aumentar el límite, visita: https://aka.ms/oai/quotaincrease"
+            )
+        
+        # Error 400: Bad Request
+        elif "400" in error_str:
+            return Exception(f"Error de solicitud: {error_str}")
+        
+        # Otros errores
+        else:
+            return Exception(f"Error al generar respuesta con Azure OpenAI: {error_str}")
+    
     def generate_response(
         self,
         system_prompt: str,
         user_message: str,
-        context_chunks: List[str],
+        context: str,
         temperature: float = 0.2
     ) -> str:
         """
@@ -37,7 +147,7 @@ class AzureOpenAIClient:
         Args:
             system_prompt: Instrucciones del sistema para el modelo.
             user_message: Pregunta o mensaje del usuario.
-            context_chunks: Lista de fragmentos de texto del contexto recuperado.
+            context: Texto del contexto recuperado, ya unido y listo para el prompt.
             temperature: Temperatura para la generación (0.0-1.0). Valores más bajos
                         dan respuestas más deterministas.
         
@@ -45,55 +155,10 @@ class AzureOpenAIClient:
             Texto de la respuesta generada por el modelo.
         """
         try:
-            # Construir el contexto concatenando los chunks
-            context_text = "\n\n".join([
-                f"[Fragmento {i+1}]\n{chunk}"
-                for i, chunk in enumerate(context_chunks)
-            ])
-            
-            # Construir el prompt del usuario con el contexto
-            user_prompt_with_context = f"""Contexto de los manuales técnicos:
-
-{context_text}
-
----
-
-Pregunta del usuario: {user_message}
-
-Por favor, responde usando únicamente la información del contexto proporcionado. Si el contexto no contiene información suficiente para responder, indícalo claramente."""
-            
-            # Preparar mensajes en formato chat
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt_with_context}
-            ]
-            
-            # Preparar parámetros de la llamada
-            # Algunos modelos solo soportan temperature=1 (valor por defecto)
-            call_params = {
-                "model": self.config.deployment_name,
-                "messages": messages,
-                "max_completion_tokens": 500  # Reducido para ahorrar tokens y evitar rate limits
-            }
-            
-            # Solo añadir temperature si es diferente de 1.0
-            # Si el modelo no lo soporta, se intentará sin este parámetro
-            if temperature != 1.0:
-                call_params["temperature"] = temperature
-            
-            # Llamar al modelo
-            try:
-                response = self.client.chat.completions.create(**call_params)
-            except Exception as temp_error:
-                # Si falla por temperature no soportado, reintentar sin ese parámetro
-                error_str = str(temp_error)
-                if "temperature" in error_str.lower() and "unsupported" in error_str.lower():
-                    # Reintentar sin temperature (usará el valor por defecto del modelo)
-                    call_params.pop("temperature", None)
-                    response = self.client.chat.completions.create(**call_params)
-                else:
-                    # Si es otro error, relanzarlo
-                    raise
+            call_params = self._build_call_params(
+                system_prompt, user_message, context, temperature
+            )
+            response = self._create_completion(call_params)
             
             # Extraer y retornar el texto de la respuesta
             if response.choices and len(response.choices) > 0:
@@ -102,22 +167,66 @@ Por favor, responde usando únicamente la información del contexto proporcionad
                 return "No se pudo generar una respuesta."
                 
         except Exception as e:
-            # Detectar errores específicos de Azure OpenAI
-            error_str = str(e)
-            
-            # Error 429: Rate Limit (límite de tasa alcanzado)
-            if "429" in error_str or "RateLimitReached" in error_str or "rate limit" in error_str.lower():
-                raise Exception(
-                    "Límite de tasa alcanzado: Has excedido el límite de tokens por minuto de tu plan de Azure OpenAI. "
-                    "Por favor, espera 60 segundos antes de intentar de nuevo. "
-                    "Para aumentar el límite, visita: https://aka.ms/oai/quotaincrease"
-                )
-            
-            # Error 400: Bad Request
-            elif "400" in error_str:
-                raise Exception(f"Error de solicitud: {error_str}")
+            raise self._translate_error(e)
+    
+    def generate_response_stream(
+        self,
+        system_prompt: str,
+        user_message: str,
+        context: str,
+        temperature: float = 0.2
+    ) -> Iterator[str]:
+        """
+        Genera una respuesta en modo streaming, entregando el texto a medida
+        que el modelo lo produce.
+        
+        La solicitud al modelo se envía al llamar a este método, de modo que los
+        errores de la llamada (p. ej. rate limit) se lanzan aquí y no al consumir
+        el iterador.
+        
+        Args:
+            system_prompt: Instrucciones del sistema para el modelo.
+            user_message: Pregunta o mensaje del usuario.
+            context: Texto del contexto recuperado, ya unido y listo para el prompt.
+            temperature: Temperatura para la generación (0.0-1.0).
+        
+        Returns:
+            Iterador de fragmentos de texto de la respuesta.
+        """
+        try:
+            call_params = self._build_call_params(
+                system_prompt, user_message, context, temperature
+            )
+            call_params["stream"] = True
+            response = self._create_completion(call_params)
+        except Exception as e:
+            raise self._translate_error(e)
+        
+        return self._iter_deltas(response)
+    
+    def _iter_deltas(self, response) -> Iterator[str]:
+        """
+        Extrae el texto de los chunks de una respuesta en streaming.
+        
+        Args:
+            response: Stream devuelto por client.chat.completions.create.
+        
+        Yields:
+            Fragmentos de texto de la respuesta.
+        """
+        try:
+            produced = False
+            for chunk in response:
+                # Azure puede enviar chunks sin choices (p. ej. filtros de contenido)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    produced = True
+                    yield delta
             
-            # Otros errores
-            else:
-                raise Exception(f"Error al generar respuesta con Azure OpenAI: {error_str}")
-
+            if not produced:
+                yield "No se pudo generar una respuesta."
+                
+        except Exception as e:
+            raise self._translate_error(e)
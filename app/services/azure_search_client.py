@@ -1,12 +1,34 @@
 """
 Cliente para interactuar con Azure AI Search.
 """
-from typing import List, Dict
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import List, NamedTuple, Optional
+import requests
 from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import RequestsTransport
 from azure.search.documents import SearchClient
 
 from app.config import AzureSearchConfig
 
+# Sesión HTTP compartida por todos los clientes de búsqueda del proceso:
+# reutiliza conexiones keep-alive y evita repetir el handshake TLS por consulta
+_HTTP_SESSION = requests.Session()
+
+# Pool compartido para consultar varios índices en paralelo; sus hilos se crean
+# bajo demanda y el intérprete los cierra al terminar el proceso
+_SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="azure-search")
+
+
+class SearchHit(NamedTuple):
+    """Documento devuelto por Azure AI Search, con los campos ya mapeados."""
+    content: str
+    source: str
+    path: str
+    score: float
+    page: Optional[int] = None
+
 
 class AzureSearchClient:
     """Cliente para realizar búsquedas en Azure AI Search."""
@@ -19,16 +41,69 @@ class AzureSearchClient:
             config: Configuración de Azure AI Search.
         """
         self.config = config
-        self.client = SearchClient(
-            endpoint=config.endpoint,
-            index_name=config.index_name,
-            credential=AzureKeyCredential(config.api_key)
-        )
+        credential = AzureKeyCredential(config.api_key)
+        transport = RequestsTransport(session=_HTTP_SESSION, session_owner=False)
+        
+        # Un cliente por índice configurado (load_config garantiza al menos uno)
+        self.clients = [
+            SearchClient(
+                endpoint=config.endpoint,
+                index_name=index_name,
+                credential=credential,
+                transport=transport
+            )
+            for index_name in config.index_names
+        ]
+        self.client = self.clients[0]
+    
+    @staticmethod
+    def _search_index(client: SearchClient, query: str, top_k: int) -> List[SearchHit]:
+        """
+        Ejecuta la búsqueda textual en un índice y mapea los campos del resultado.
+        
+        Args:
+            client: Cliente del índice a consultar.
+            query: Texto de búsqueda del usuario.
+            top_k: Número máximo de documentos a retornar.
+        
+        Returns:
+            Lista de SearchHit con los campos mapeados.
+        """
+        # Búsqueda textual estándar sobre el campo 'content'
+        search_options = {
+            "search_text": query,
+            "top": top_k,
+            "include_total_count": True
+        }
+        
+        # Ejecutar búsqueda
+        results = client.search(**search_options)
+        
+        # Procesar resultados y mapear campos del índice real
+        documents = []
+        for result in results:
+            doc = SearchHit(
+                content=result.get("content") or "",
+                # Mapear metadata_storage_name -> source (nombre del PDF)
+                source=result.get("metadata_storage_name", "Unknown"),
+                # Mapear metadata_storage_path -> path (clave del documento)
+                path=result.get("metadata_storage_path", ""),
+                # Score de relevancia de Azure AI Search
+                score=result.get("@search.score", 0.0),
+                # Solo presente en índices con el campo pageNumber
+                page=result.get("pageNumber")
+            )
+            documents.append(doc)
+        
+        return documents
     
-    def search_documents(self, query: str, top_k: int = 5) -> List[Dict]:
+    def search_documents(self, query: str, top_k: int = 5) -> List[SearchHit]:
         """
         Busca documentos relevantes en el índice usando búsqueda textual sobre el campo 'content'.
         
+        Si se configuraron varios índices, se consultan en paralelo y se combinan
+        los resultados por score.
+        
         El índice real usa:
         - content: texto de los manuales (searchable)
         - metadata_storage_name: nombre del archivo PDF (se mapea a "source")
@@ -39,44 +114,34 @@ class AzureSearchClient:
             top_k: Número máximo de documentos a retornar.
         
         Returns:
-            Lista de diccionarios con documentos encontrados. Cada documento contiene:
-            - "content": texto del campo content
-            - "source": nombre del archivo PDF (desde metadata_storage_name)
-            - "path": ruta del documento (desde metadata_storage_path, para depuración)
-            - "score": score de relevancia de la búsqueda
+            Lista de SearchHit con los documentos encontrados. Cada documento contiene:
+            - content: texto del campo content
+            - source: nombre del archivo PDF (desde metadata_storage_name)
+            - path: ruta del documento (desde metadata_storage_path, para depuración)
+            - score: score de relevancia de la búsqueda
+            - page: número de página, si el índice lo incluye
         """
         try:
-            # Búsqueda textual estándar sobre el campo 'content'
-            search_options = {
-                "search_text": query,
-                "top": top_k,
-                "include_total_count": True
-            }
-            
-            # Ejecutar búsqueda
-            results = self.client.search(**search_options)
-            
-            # Procesar resultados y mapear campos del índice real
-            documents = []
-            for result in results:
-                doc = {
-                    "content": result.get("content", ""),
-                    # Mapear metadata_storage_name -> source (nombre del PDF)
-                    "source": result.get("metadata_storage_name", "Unknown"),
-                    # Mapear metadata_storage_path -> path (clave del documento)
-                    "path": result.get("metadata_storage_path", ""),
-                    # Score de relevancia de Azure AI Search
-                    "score": result.get("@search.score", 0.0)
-                }
-                documents.append(doc)
+            if len(self.clients) == 1:
+                return self._search_index(self.client, query, top_k)
             
-            return documents
+            # Varios índices: consultarlos en paralelo y quedarse con los top_k
+            # resultados de mayor score entre todos
+            per_index = _SEARCH_EXECUTOR.map(
+                lambda client: self._search_index(client, query, top_k),
+                self.clients
+            )
+            return heapq.nlargest(
+                top_k,
+                chain.from_iterable(per_index),
+                key=lambda doc: doc.score
+            )
             
         except Exception as e:
             # Manejo básico de errores
             raise Exception(f"Error al buscar en Azure AI Search: {str(e)}")
     
-    def search_documents_text_only(self, query: str, top_k: int = 5) -> List[Dict]:
+    def search_documents_text_only(self, query: str, top_k: int = 5) -> List[SearchHit]:
         """
         Busca documentos usando solo búsqueda por texto (sin vectores).
         Método de conveniencia que llama a search_documents.
@@ -2,15 +2,122 @@
 Pipeline RAG (Retrieval Augmented Generation) que orquesta la búsqueda
 y generación de respuestas.
 """
-from typing import Dict, List, Optional
-from app.services.azure_search_client import AzureSearchClient
-from app.services.azure_openai_client import AzureOpenAIClient
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Final, Tuple
 from app.config import AzureSearchConfig, AzureOpenAIConfig
 
+# Límites de contexto en tokens para evitar exceder el límite del modelo
+MAX_TOKENS_PER_CHUNK = 500          # Máximo de tokens por chunk
+MAX_TOTAL_CONTEXT_TOKENS = 1500     # Máximo total de tokens en el contexto
+
+# Límites equivalentes en caracteres, usados si tiktoken no está disponible
+MAX_CHARS_PER_CHUNK = 2000  # Máximo de caracteres por chunk
+MAX_TOTAL_CONTEXT = 6000    # Máximo total de caracteres en el contexto
+
+TRUNCATION_MARKER = "... [texto truncado]"
+
+# Tokenizador de tiktoken (o200k_base: familia GPT-4o)
+TOKENIZER_ENCODING = "o200k_base"
+TOKENIZER_LOAD_TIMEOUT = 10  # Segundos máximos para cargar/descargar el vocabulario
+
+# Vocabulario de tiktoken empaquetado con el proyecto (opcional); se usa si
+# TIKTOKEN_CACHE_DIR no está definido
+_BUNDLED_TIKTOKEN_CACHE = Path(__file__).resolve().parents[2] / "tiktoken_cache"
+
+# Respuesta para preguntas vacías (se evita consultar Azure)
+_EMPTY_QUESTION_ANSWER = "Por favor escribe una pregunta."
+
+# Detector de errores de límite de tasa (una sola pasada, sin copiar en minúsculas)
+_RATE_LIMIT_RE = re.compile(r"rate limit|Límite de tasa alcanzado", re.IGNORECASE)
+
+# Prompt del sistema para el modelo (internado una sola vez por proceso)
+_SYSTEM_PROMPT: Final[str] = sys.intern("""Eres un asistente especializado para field engineers de dispositivos biomédicos. 
+Tu función es ayudar a los técnicos a encontrar información en los manuales técnicos y de usuario.
+
+INSTRUCCIONES:
+- Usa ÚNICAMENTE la información proporcionada en el contexto de los manuales.
+- Si el contexto no contiene información suficiente para responder la pregunta, di claramente: "No encontré información suficiente en los manuales para responder esta pregunta."
+- Proporciona respuestas claras, concisas y técnicas.
+- Si mencionas procedimientos, sé específico sobre los pasos.
+- Si hay información sobre modelos o números de parte, inclúyela en tu respuesta.""")
+
+logger = logging.getLogger(__name__)
+
+
+def _load_encoder():
+    """
+    Carga el tokenizador de tiktoken con un tiempo máximo de espera.
+    
+    Si no existe vocabulario en caché, tiktoken lo descarga sin timeout; por eso
+    la carga se hace en un hilo aparte y se abandona pasado TOKENIZER_LOAD_TIMEOUT.
+    
+    Returns:
+        Encoding de tiktoken, o None si no está disponible (se usan entonces los
+        límites por caracteres).
+    """
+    if "TIKTOKEN_CACHE_DIR" not in os.environ and _BUNDLED_TIKTOKEN_CACHE.is_dir():
+        os.environ["TIKTOKEN_CACHE_DIR"] = str(_BUNDLED_TIKTOKEN_CACHE)
+    
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken no está instalado; el contexto se limitará por caracteres.")
+        return None
+    
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        future = executor.submit(tiktoken.get_encoding, TOKENIZER_ENCODING)
+        return future.result(timeout=TOKENIZER_LOAD_TIMEOUT)
+    except Exception as e:
+        logger.warning(
+            "No se pudo cargar el tokenizador %s (%r); el contexto se limitará por caracteres. "
+            "Define TIKTOKEN_CACHE_DIR con el vocabulario descargado para evitarlo.",
+            TOKENIZER_ENCODING, e
+        )
+        return None
+    finally:
+        executor.shutdown(wait=False)
+
+
+def _clip(text: str, limit: int, encoder=None) -> Tuple[str, int, bool]:
+    """
+    Recorta un texto a un presupuesto en tokens (o caracteres sin tokenizador).
+    
+    Args:
+        text: Texto a recortar.
+        limit: Presupuesto máximo en la unidad activa.
+        encoder: Encoding de tiktoken, o None para contar caracteres.
+    
+    Returns:
+        Tupla (texto recortado, unidades consumidas, si hubo truncado).
+    """
+    if encoder is None:
+        if len(text) > limit:
+            return text[:limit], limit, True
+        return text, len(text), False
+    
+    # encode_ordinary: el texto recuperado no es confiable y puede contener cadenas
+    # de tokens especiales (p. ej. "<|endoftext|>"), que encode() rechaza
+    tokens = encoder.encode_ordinary(text)
+    if len(tokens) <= limit:
+        return text, len(tokens), False
+    
+    # Un token puede cortar un carácter multibyte (tildes, ñ): se descartan los
+    # bytes incompletos del final en lugar de producir U+FFFD
+    clipped = encoder.decode_bytes(tokens[:limit]).decode("utf-8", errors="ignore")
+    return clipped, limit, True
+
 
 class RAGPipeline:
     """Pipeline que implementa el patrón RAG completo."""
     
+    SYSTEM_PROMPT = _SYSTEM_PROMPT
+    
     def __init__(
         self,
         search_config: AzureSearchConfig,
@@ -23,19 +130,135 @@ class RAGPipeline:
             search_config: Configuración de Azure AI Search.
             openai_config: Configuración de Azure OpenAI.
         """
+        # Imports diferidos: los SDKs de Azure solo se cargan al crear el pipeline
+        from app.services.azure_search_client import AzureSearchClient
+        from app.services.azure_openai_client import AzureOpenAIClient
+        
         self.search_client = AzureSearchClient(search_config)
         self.openai_client = AzureOpenAIClient(openai_config)
         
-        # Prompt del sistema para el modelo
-        self.system_prompt = """Eres un asistente especializado para field engineers de dispositivos biomédicos. 
-Tu función es ayudar a los técnicos a encontrar información en los manuales técnicos y de usuario.
-
-INSTRUCCIONES:
-- Usa ÚNICAMENTE la información proporcionada en el contexto de los manuales.
-- Si el contexto no contiene información suficiente para responder la pregunta, di claramente: "No encontré información suficiente en los manuales para responder esta pregunta."
-- Proporciona respuestas claras, concisas y técnicas.
-- Si mencionas procedimientos, sé específico sobre los pasos.
-- Si hay información sobre modelos o números de parte, inclúyela en tu respuesta."""
+        # Tokenizador para limitar el contexto; sin él se limita por caracteres
+        self.encoder = _load_encoder()
+        if self.encoder is not None:
+            self.chunk_budget, self.total_budget = MAX_TOKENS_PER_CHUNK, MAX_TOTAL_CONTEXT_TOKENS
+        else:
+            self.chunk_budget, self.total_budget = MAX_CHARS_PER_CHUNK, MAX_TOTAL_CONTEXT
+    
+    def _retrieve(self, user_question: str, top_k: int) -> Dict:
+        """
+        Busca en Azure AI Search y prepara el contexto y las fuentes.
+        
+        Args:
+            user_question: Pregunta del usuario.
+            top_k: Número de documentos a recuperar de Azure Search.
+        
+        Returns:
+            Diccionario con "context" (texto listo para el prompt) y "sources".
+            Si no hay contexto útil, contiene en su lugar "answer" con el mensaje
+            para el usuario y "sources" vacío.
+        """
+        # Paso 1: Buscar documentos relevantes en Azure AI Search
+        search_results = self.search_client.search_documents_text_only(
+            query=user_question,
+            top_k=top_k
+        )
+        
+        # Paso 2: Validar que se encontraron resultados
+        if not search_results or len(search_results) == 0:
+            return {
+                "answer": "No se encontró información relevante en los manuales para responder tu pregunta. Por favor, intenta reformularla o usar términos más específicos.",
+                "sources": []
+            }
+        
+        # Paso 3: Extraer y limitar fragmentos de texto (campo "content")
+        # Aplicar límites para evitar exceder el límite de tokens
+        context_chunks = []
+        remaining = self.total_budget
+        truncated = False
+        
+        for doc in search_results:
+            content = doc.content
+            if not content:
+                continue
+            
+            # Un solo recorte por documento: límite por chunk y presupuesto restante
+            content, used, clipped = _clip(
+                content, min(self.chunk_budget, remaining), self.encoder
+            )
+            truncated = truncated or clipped
+            
+            context_chunks.append(content)
+            remaining -= used
+            if remaining <= 0:
+                break
+        
+        # Marcar el truncado una única vez al final del contexto
+        if truncated:
+            context_chunks[-1] += TRUNCATION_MARKER
+        
+        if not context_chunks:
+            return {
+                "answer": "Se encontraron documentos pero no contenían texto útil. Por favor, intenta otra pregunta.",
+                "sources": []
+            }
+        
+        # Unir los fragmentos una sola vez en el texto final del contexto
+        context_text = "\n\n".join(
+            f"[Fragmento {i}]\n{chunk}"
+            for i, chunk in enumerate(context_chunks, 1)
+        )
+        
+        # Paso 4: Preparar información de fuentes
+        # Los resultados ya vienen con el campo "source" mapeado desde metadata_storage_name
+        # Se conserva una sola entrada por PDF: la de mayor score
+        seen: Dict[str, Dict] = {}
+        for doc in search_results:
+            name = doc.source  # Nombre del PDF
+            score = doc.score  # Score de relevancia
+            current = seen.get(name)
+            if current is not None and score <= current["score"]:
+                continue
+            
+            # Path incluido para depuración si es necesario
+            source_info = {"source": name, "score": score, "path": doc.path}
+            if doc.page is not None:
+                source_info["pageNumber"] = doc.page
+            
+            seen[name] = source_info
+        
+        return {
+            "context": context_text,
+            "sources": list(seen.values())
+        }
+    
+    @staticmethod
+    def _error_result(error: Exception) -> Dict:
+        """
+        Convierte una excepción en una respuesta de error para el usuario.
+        
+        Args:
+            error: Excepción capturada durante el pipeline.
+        
+        Returns:
+            Diccionario con "answer", "sources" vacío y "error" en True.
+        """
+        # Manejo de errores con mensajes más específicos
+        error_message = str(error)
+        
+        # Si el error ya tiene un mensaje claro (como rate limit), usarlo directamente
+        if _RATE_LIMIT_RE.search(error_message):
+            return {
+                "answer": f"⚠️ **Límite de tasa alcanzado**\n\n{error_message}\n\nPor favor, espera un momento antes de hacer otra pregunta.",
+                "sources": [],
+                "error": True
+            }
+        
+        # Otros errores
+        return {
+            "answer": f"❌ **Error al procesar tu pregunta**\n\n{error_message}\n\nPor favor, intenta de nuevo o verifica tu configuración de Azure.",
+            "sources": [],
+            "error": True
+        }
     
     def rag_answer(
         self,
@@ -56,99 +279,82 @@ INSTRUCCIONES:
                 - "answer": texto de la respuesta generada.
                 - "sources": lista de fuentes usadas (cada fuente es un dict con
                             "source", "pageNumber", "score", etc.).
+                - "error": True solo si la respuesta es un mensaje de error
+                           (útil para no cachearla).
         """
+        # Evitar búsqueda y llamada al modelo si la pregunta está vacía
+        question = (user_question or "").strip()
+        if not question:
+            return {"answer": _EMPTY_QUESTION_ANSWER, "sources": []}
+        
         try:
-            # Paso 1: Buscar documentos relevantes en Azure AI Search
-            search_results = self.search_client.search_documents_text_only(
-                query=user_question,
-                top_k=top_k
-            )
-            
-            # Paso 2: Validar que se encontraron resultados
-            if not search_results or len(search_results) == 0:
-                return {
-                    "answer": "No se encontró información relevante en los manuales para responder tu pregunta. Por favor, intenta reformularla o usar términos más específicos.",
-                    "sources": []
-                }
-            
-            # Paso 3: Extraer y limitar fragmentos de texto (campo "content")
-            # Aplicar límites para evitar exceder el límite de tokens
-            MAX_CHARS_PER_CHUNK = 2000  # Máximo de caracteres por chunk
-            MAX_TOTAL_CONTEXT = 6000    # Máximo total de caracteres en el contexto
-            
-            context_chunks = []
-            total_chars = 0
-            
-            for doc in search_results:
-                content = doc.get("content", "")
-                if not content:
-                    continue
-                
-                # Truncar chunks muy largos
-                if len(content) > MAX_CHARS_PER_CHUNK:
-                    content = content[:MAX_CHARS_PER_CHUNK] + "... [texto truncado]"
-                
-                # Verificar si añadir este chunk excedería el límite total
-                chunk_size = len(content)
-                if total_chars + chunk_size > MAX_TOTAL_CONTEXT:
-                    # Si ya tenemos al menos un chunk, parar aquí
-                    if context_chunks:
-                        break
-                    # Si es el primer chunk y es muy grande, truncarlo más
-                    content = content[:MAX_TOTAL_CONTEXT] + "... [texto truncado]"
-                    context_chunks.append(content)
-                    break
-                
-                context_chunks.append(content)
-                total_chars += chunk_size
+            retrieval = self._retrieve(question, top_k)
+            if "answer" in retrieval:
+                return retrieval
             
-            if not context_chunks:
-                return {
-                    "answer": "Se encontraron documentos pero no contenían texto útil. Por favor, intenta otra pregunta.",
-                    "sources": []
-                }
-            
-            # Paso 4: Generar respuesta usando Azure OpenAI con el contexto
+            # Paso 5: Generar respuesta usando Azure OpenAI con el contexto
             answer = self.openai_client.generate_response(
-                system_prompt=self.system_prompt,
-                user_message=user_question,
-                context_chunks=context_chunks,
+                system_prompt=self.SYSTEM_PROMPT,
+                user_message=question,
+                context=retrieval["context"],
                 temperature=temperature
             )
             
-            # Paso 5: Preparar información de fuentes
-            # Los resultados ya vienen con el campo "source" mapeado desde metadata_storage_name
-            sources = []
-            for doc in search_results:
-                source_info = {
-                    "source": doc.get("source", "Unknown"),  # Nombre del PDF
-                    "score": doc.get("score", 0.0)  # Score de relevancia
-                }
-                # Opcional: incluir path para depuración si es necesario
-                if "path" in doc:
-                    source_info["path"] = doc["path"]
-                
-                sources.append(source_info)
-            
             return {
                 "answer": answer,
-                "sources": sources
+                "sources": retrieval["sources"]
             }
             
         except Exception as e:
-            # Manejo de errores con mensajes más específicos
-            error_message = str(e)
+            return self._error_result(e)
+    
+    def rag_answer_stream(
+        self,
+        user_question: str,
+        top_k: int = 3,
+        temperature: float = 1.0
+    ) -> Dict:
+        """
+        Variante de rag_answer que entrega la respuesta por fragmentos a medida
+        que el modelo la genera.
+        
+        La búsqueda y la solicitud al modelo se ejecutan antes de retornar, así que
+        "sources" y "error" ya son definitivos. Si la generación falla a mitad del
+        stream, el iterador lanza la excepción.
+        
+        Args:
+            user_question: Pregunta del usuario.
+            top_k: Número de documentos a recuperar de Azure Search.
+            temperature: Temperatura para la generación del modelo.
+        
+        Returns:
+            Diccionario con:
+                - "answer": iterador de fragmentos de texto, o un str completo si no
+                            hubo generación (pregunta vacía, sin contexto o error).
+                - "sources": lista de fuentes usadas.
+                - "error": True solo si la respuesta es un mensaje de error.
+        """
+        # Evitar búsqueda y llamada al modelo si la pregunta está vacía
+        question = (user_question or "").strip()
+        if not question:
+            return {"answer": _EMPTY_QUESTION_ANSWER, "sources": []}
+        
+        try:
+            retrieval = self._retrieve(question, top_k)
+            if "answer" in retrieval:
+                return retrieval
             
-            # Si el error ya tiene un mensaje claro (como rate limit), usarlo directamente
-            if "Límite de tasa alcanzado" in error_message or "rate limit" in error_message.lower():
-                return {
-                    "answer": f"⚠️ **Límite de tasa alcanzado**\n\n{error_message}\n\nPor favor, espera un momento antes de hacer otra pregunta.",
-                    "sources": []
-                }
+            tokens = self.openai_client.generate_response_stream(
+                system_prompt=self.SYSTEM_PROMPT,
+                user_message=question,
+                context=retrieval["context"],
+                temperature=temperature
+            )
             
-            # Otros errores
             return {
-                "answer": f"❌ **Error al procesar tu pregunta**\n\n{error_message}\n\nPor favor, intenta de nuevo o verifica tu configuración de Azure.",
-                "sources": []
+                "answer": tokens,
+                "sources": retrieval["sources"]
             }
-
+            
+        except Exception as e:
+            return self._error_result(e)
@@ -0,0 +1,59 @@
+"""
+Compila el archivo .env a un módulo Python (app/_env_compiled.py) con
+asignaciones literales, para que la configuración se cargue desde bytecode
+cacheado sin parsear .env en cada arranque.
+
+Uso:
+    python scripts/compile_env.py [ruta/.env]
+"""
+import sys
+from pathlib import Path
+
+from dotenv import dotenv_values
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+OUTPUT_PATH = ROOT_DIR / "app" / "_env_compiled.py"
+
+HEADER = '''"""
+Configuración compilada desde .env por scripts/compile_env.py.
+NO editar a mano ni subir al repositorio (contiene credenciales).
+"""
+'''
+
+
+def compile_env(env_path: Path, output_path: Path = OUTPUT_PATH) -> int:
+    """
+    Lee un archivo .env y escribe un módulo Python con sus variables.
+    
+    Args:
+        env_path: Ruta del archivo .env a compilar.
+        output_path: Ruta del módulo Python a generar.
+    
+    Returns:
+        Número de variables escritas.
+    
+    Raises:
+        FileNotFoundError: Si el archivo .env no existe.
+    """
+    if not env_path.is_file():
+        raise FileNotFoundError(f"No se encontró el archivo {env_path}")
+    
+    values = dotenv_values(env_path)
+    lines = [HEADER]
+    for name, value in values.items():
+        if value is None or not name.isidentifier():
+            continue
+        lines.append(f"{name} = {value!r}\n")
+    
+    output_path.write_text("".join(lines), encoding="utf-8")
+    return len(lines) - 1
+
+
+if __name__ == "__main__":
+    env_file = Path(sys.argv[1]) if len(sys.argv) > 1 else ROOT_DIR / ".env"
+    try:
+        count = compile_env(env_file)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"{count} variables escritas en {OUTPUT_PATH}")